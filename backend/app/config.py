@@ -1,4 +1,4 @@
-from pydantic_settings import BaseSettings
+from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
 import os
 from dotenv import load_dotenv
@@ -9,12 +9,16 @@ class Settings(BaseSettings):
     PROJECT_NAME: str = "Clear Target API"
     VERSION: str = "1.0.0"
     API_V1_STR: str = "/api/v1"
+    DEBUG: bool = False
     
     # CORS设置
     BACKEND_CORS_ORIGINS: list = ["http://localhost:3000"]
     
     # 数据库设置
     DATABASE_URL: str = "sqlite+aiosqlite:///./sql_app.db"
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE: int = 1800
     
     # JWT设置
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-for-development")
@@ -24,9 +28,8 @@ class Settings(BaseSettings):
     # Gemini API设置
     GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY", "")
 
-    class Config:
-        case_sensitive = True
+    model_config = SettingsConfigDict(case_sensitive=True, frozen=True)
 
-@lru_cache()
+@lru_cache(maxsize=1)
 def get_settings():
     return Settings()
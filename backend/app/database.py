@@ -1,18 +1,81 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+import logging
+
+import orjson
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
 from .config import get_settings
 
 settings = get_settings()
 
-# 创建异步引擎
+# SQL语句日志只在DEBUG模式下通过echo开启，避免在请求路径上格式化每条语句
+logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
+
+# 连接池配置：内存数据库只能共享同一个连接，文件数据库使用固定大小的连接池
+if ":memory:" in settings.DATABASE_URL:
+    pool_options = {"poolclass": StaticPool}
+else:
+    pool_options = {
+        "poolclass": AsyncAdaptedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_pre_ping": True,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+    }
+
+connect_args = {"check_same_thread": False} if settings.DATABASE_URL.startswith("sqlite") else {}
+
+# 创建异步引擎（全局唯一）
 engine = create_async_engine(
-    "sqlite+aiosqlite:///./sql_app.db",
-    echo=True,
+    settings.DATABASE_URL,
+    echo=settings.DEBUG,
+    connect_args=connect_args,
+    # JSON列使用orjson读写，新写入的数据中文不转义
+    json_serializer=lambda obj: orjson.dumps(obj).decode(),
+    json_deserializer=orjson.loads,
+    **pool_options,
 )
 
+# SQLite连接参数：WAL模式允许读写并发，synchronous=NORMAL减少每次提交的fsync
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.close()
+
+# 支持 ON CONFLICT 的 INSERT 构造按当前数据库方言选择
+_DIALECT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+async def insert_or_ignore(db: AsyncSession, entity, index_elements: list[str], **values):
+    """插入一行并返回ORM对象；唯一约束冲突时返回 None
+
+    SQLite / PostgreSQL 使用 INSERT ... ON CONFLICT DO NOTHING RETURNING，一条语句完成；
+    其他方言退回普通插入，由唯一约束抛出的 IntegrityError 判断冲突（会回滚当前会话）。
+    """
+    dialect_insert = _DIALECT_INSERTS.get(engine.dialect.name)
+    if dialect_insert is not None:
+        result = await db.execute(
+            dialect_insert(entity)
+            .values(**values)
+            .on_conflict_do_nothing(index_elements=index_elements)
+            .returning(entity)
+        )
+        return result.scalar_one_or_none()
+    
+    obj = entity(**values)
+    db.add(obj)
+    try:
+        await db.flush()
+    except IntegrityError:
+        await db.rollback()
+        return None
+    return obj
+
 # 创建异步会话工厂
-AsyncSessionLocal = sessionmaker(
-    engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-) 
\ No newline at end of file
+AsyncSessionLocal = async_sessionmaker(engine, expire_on_commit=False)
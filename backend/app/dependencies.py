@@ -1,44 +1,100 @@
-from typing import Generator, Optional
+from typing import AsyncGenerator, AsyncIterator, Optional
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
+from jwt import InvalidTokenError
 from passlib.context import CryptContext
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
-from sqlalchemy.orm import sessionmaker
-import google.generativeai as genai
-import json
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+from cachetools import TTLCache
+import anyio
+import asyncio
+import atexit
+import hashlib
+import jwt
 import logging
+import orjson
+import queue
+import re
+import time
 
 from .config import get_settings
+from .database import AsyncSessionLocal
 from . import models, schemas
 from .prompts import PromptManager
 
-# 配置logger
+# 配置logger：请求路径上只把日志记录放入队列，由后台线程负责格式化和写入stdout
+_log_queue = queue.SimpleQueue()
+_log_listener = QueueListener(_log_queue, logging.StreamHandler(), respect_handler_level=True)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(_log_queue)])
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
 settings = get_settings()
 
-# 数据库配置
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
-AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+# 热路径上用到的配置在模块加载时取出，避免每次签发/校验token都访问settings
+_SECRET = settings.SECRET_KEY.encode()
+_ALGORITHM = settings.ALGORITHM
+_ALGS = (_ALGORITHM,)
+# token使用 SECRET_KEY 对称签名和校验，只支持HMAC算法（HS256/HS384/HS512）；
+# HMAC签名只需几微秒，可直接在事件循环中执行
+if not _ALGORITHM.startswith("HS"):
+    raise RuntimeError(f"ALGORITHM 必须是HMAC算法（如 HS256），当前为 {_ALGORITHM}")
+_API_V1 = settings.API_V1_STR
 
-# 密码哈希配置
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# 密码哈希配置：新密码使用argon2id，已有的bcrypt哈希仍可校验，并在下次登录时自动升级
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    argon2__memory_cost=19456,
+    argon2__time_cost=2,
+    argon2__parallelism=1,
+    bcrypt__rounds=10,
+)
 
 # OAuth2配置
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/login")
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{_API_V1}/login")
 
-# Gemini配置
-genai.configure(api_key=settings.GEMINI_API_KEY)
-model = genai.GenerativeModel('gemini-1.5-flash')
+# 认证缓存：token摘要 -> (email, exp)，email -> 用户，避免每个请求都重新校验JWT和查询数据库
+_token_cache = TTLCache(maxsize=10_000, ttl=60)
+_user_cache = TTLCache(maxsize=10_000, ttl=60)
 
-async def get_db() -> Generator:
+# Gemini结果缓存：按提示词摘要缓存已通过校验的结果，相同输入不再重复调用LLM
+# 缓存中保存序列化后的字节，每次命中都解析出新的字典，调用方修改结果不会影响缓存
+_llm_cache = TTLCache(maxsize=1024, ttl=3600)
+
+def _llm_cache_get(key: bytes) -> Optional[dict]:
+    cached = _llm_cache.get(key)
+    return orjson.loads(cached) if cached is not None else None
+
+def _llm_cache_set(key: bytes, value: dict) -> None:
+    _llm_cache[key] = orjson.dumps(value)
+
+# 进行中的Gemini请求：相同提示词的并发调用共享同一个任务，只请求一次；
+# 记录等待者数量，全部等待者取消后底层调用也随之取消
+_inflight = {}
+
+def _prompt_key(prompt: str) -> bytes:
+    return hashlib.blake2b(prompt.encode(), digest_size=16).digest()
+
+# Gemini响应解析：预编译代码块和注释的正则
+_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL)
+_COMMENT_RE = re.compile(rb"//[^\n]*")
+_TRAILING_COMMA_RE = re.compile(rb",\s*([\]}])")
+
+# Gemini配置：首次调用时才导入客户端库，不使用AI的接口和进程无需加载
+@lru_cache(maxsize=1)
+def _get_model():
+    import google.generativeai as genai
+    genai.configure(api_key=settings.GEMINI_API_KEY)
+    return genai.GenerativeModel('gemini-1.5-flash')
+
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
-        try:
-            yield session
-        finally:
-            await session.close()
+        yield session
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -47,31 +103,36 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 async def get_user(db: AsyncSession, email: str):
-    stmt = models.User.__table__.select().where(models.User.email == email)
+    # 只加载认证需要的列，users表以后增加字段也不会拖慢每次认证
+    stmt = (
+        select(models.User)
+        .options(load_only(models.User.id, models.User.email, models.User.hashed_password))
+        .where(models.User.email == email)
+    )
     result = await db.execute(stmt)
-    user = result.first()
-    if user:
-        return models.User(
-            id=user[0],
-            email=user[1],
-            hashed_password=user[2]
-        )
-    return None
+    return result.scalar_one_or_none()
 
 async def authenticate_user(db: AsyncSession, email: str, password: str):
     user = await get_user(db, email)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    # 密码校验放到线程池执行，避免阻塞事件循环
+    verified, new_hash = await anyio.to_thread.run_sync(
+        pwd_context.verify_and_update, password, user.hashed_password
+    )
+    if not verified:
         return False
+    # 旧方案（bcrypt）的哈希在登录成功后升级为argon2
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
-    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    return jwt.encode(to_encode, _SECRET, algorithm=_ALGORITHM)
 
 async def get_current_user(
-    db: AsyncSession = Depends(get_db),
     token: str = Depends(oauth2_scheme)
 ) -> models.User:
     credentials_exception = HTTPException(
@@ -79,57 +140,71 @@ async def get_current_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+    token_key = hashlib.sha256(token.encode()).digest()[:16]
+    cached = _token_cache.get(token_key)
+    if cached is not None and (cached[1] is None or cached[1] > time.time()):
+        email = cached[0]
+    else:
+        try:
+            payload = jwt.decode(token, _SECRET, algorithms=_ALGS)
+            email: str = payload.get("sub")
+            if email is None:
+                raise credentials_exception
+            token_data = schemas.TokenData(email=email)
+        except InvalidTokenError:
             raise credentials_exception
-        token_data = schemas.TokenData(email=email)
-    except JWTError:
-        raise credentials_exception
-    user = await get_user(db, email=token_data.email)
+        email = token_data.email
+        _token_cache[token_key] = (email, payload.get("exp"))
+
+    user = _user_cache.get(email)
     if user is None:
-        raise credentials_exception
+        # 使用独立的短会话查询用户，连接不会在整个请求（包括LLM调用）期间被占用
+        async with AsyncSessionLocal() as db:
+            user = await get_user(db, email=email)
+        if user is None:
+            raise credentials_exception
+        _user_cache[email] = user
     return user
 
 # Gemini相关函数
-async def generate_questions(wish: str, outcome: str) -> dict:
+async def generate_questions(wish: str, outcome: str, refresh: bool = False) -> dict:
+    """生成澄清问题，refresh=True 时跳过缓存重新生成"""
     try:
         # 获取提示词
         prompt = PromptManager.get_question_generation_prompt(wish, outcome)
-        print(f"Sending prompt to Gemini: {prompt}")
+        cache_key = _prompt_key(prompt)
+        if not refresh:
+            cached = _llm_cache_get(cache_key)
+            if cached is not None:
+                logger.debug("Question cache hit")
+                return cached
+        logger.debug("Sending prompt to Gemini: %s", prompt)
         
         # 调用 Gemini API
-        response = model.generate_content(prompt)
-        print(f"Received response from Gemini: {response.text}")
+        response = await get_gemini_response(prompt)
+        logger.debug("Received response from Gemini: %s", response.text)
         
         # 尝试解析响应
         response_text = response.text.strip()
         
         # 如果响应为空
         if not response_text:
-            print("Empty response from Gemini")
+            logger.debug("Empty response from Gemini")
             return get_default_questions()
         
         # 清理 Markdown 代码块标记
-        if response_text.startswith('```'):
-            # 找到第一个和最后一个 ``` 的位置
-            first_block = response_text.find('```')
-            last_block = response_text.rfind('```')
-            if first_block != last_block:
-                # 提取代码块内容
-                start_content = response_text.find('\n', first_block) + 1
-                content = response_text[start_content:last_block].strip()
-                response_text = content
-                print(f"Extracted content from code block: {content[:100]}...")  # 打印前100个字符
+        fence = _FENCE_RE.search(response_text)
+        if fence:
+            response_text = fence.group(1).strip()
+            logger.debug("Extracted content from code block: %.100s...", response_text)
         
         # 尝试找到并提取 JSON 部分
         try:
             # 首先尝试直接解析整个响应
-            result = json.loads(response_text)
-        except json.JSONDecodeError as e:
-            print(f"Initial JSON parse failed: {e}")
-            print("Attempting to clean and parse JSON")
+            result = orjson.loads(response_text)
+        except orjson.JSONDecodeError as e:
+            logger.debug("Initial JSON parse failed: %s", e)
+            logger.debug("Attempting to clean and parse JSON")
             
             # 清理常见的格式问题
             response_text = response_text.replace('\n', ' ').replace('\r', '')
@@ -142,22 +217,22 @@ async def generate_questions(wish: str, outcome: str) -> dict:
             if start >= 0 and end > start:
                 json_str = response_text[start:end]
                 try:
-                    result = json.loads(json_str)
-                    print(f"Successfully parsed JSON after cleaning: {json_str[:100]}...")
-                except json.JSONDecodeError as e:
-                    print(f"Failed to parse cleaned JSON: {e}")
+                    result = orjson.loads(json_str)
+                    logger.debug("Successfully parsed JSON after cleaning: %.100s...", json_str)
+                except orjson.JSONDecodeError as e:
+                    logger.debug("Failed to parse cleaned JSON: %s", e)
                     return get_default_questions()
             else:
-                print("No JSON object found in response")
+                logger.debug("No JSON object found in response")
                 return get_default_questions()
         
         # 验证响应格式
         if not isinstance(result, dict):
-            print(f"Result is not a dict: {type(result)}")
+            logger.debug("Result is not a dict: %s", type(result))
             return get_default_questions()
             
         if 'questions' not in result:
-            print(f"No questions field in result: {result.keys()}")
+            logger.debug("No questions field in result: %s", result.keys())
             # 如果有 analysis 但没有 questions，尝试从 analysis 构建问题
             if 'analysis' in result and 'key_concerns' in result['analysis']:
                 questions = []
@@ -173,20 +248,20 @@ async def generate_questions(wish: str, outcome: str) -> dict:
                 return get_default_questions()
             
         if not isinstance(result['questions'], list):
-            print(f"Questions is not a list: {type(result['questions'])}")
+            logger.debug("Questions is not a list: %s", type(result['questions']))
             return get_default_questions()
             
         # 确保每个问题都有必要的字段
         for i, q in enumerate(result['questions']):
             if not isinstance(q, dict):
-                print(f"Question {i} is not a dict: {type(q)}")
+                logger.debug("Question %s is not a dict: %s", i, type(q))
                 continue
             
             # 确保必要的字段存在
             required_fields = ['id', 'question', 'purpose']
             missing_fields = [f for f in required_fields if f not in q]
             if missing_fields:
-                print(f"Question {i} missing fields: {missing_fields}")
+                logger.debug("Question %s missing fields: %s", i, missing_fields)
                 # 补充缺失的字段
                 if 'id' not in q:
                     q['id'] = str(i + 1)
@@ -197,58 +272,53 @@ async def generate_questions(wish: str, outcome: str) -> dict:
                 if 'expected_insight' not in q:
                     q['expected_insight'] = "获取用户的具体想法"
         
+        _llm_cache_set(cache_key, result)
         return result
         
     except Exception as e:
-        print(f"Error in generate_questions: {str(e)}")
+        logger.error("Error in generate_questions: %s", e)
         return get_default_questions()
 
-def get_default_questions():
-    """返回默认的问题列表"""
-    return {
-        "questions": [
+# 默认问题列表：Gemini不可用或响应无法解析时的兜底内容，模块加载时只构建一次
+_DEFAULT_QUESTIONS = {
+    "questions": [
         {
             "id": "1",
-                "question": "你对这个目标的理解是什么？",
-                "purpose": "确保我们对目标有共同的理解",
-                "expected_insight": "了解用户对目标的具体认知"
+            "question": "你对这个目标的理解是什么？",
+            "purpose": "确保我们对目标有共同的理解",
+            "expected_insight": "了解用户对目标的具体认知"
         },
         {
             "id": "2",
-                "question": "你目前在这个方向上遇到的主要挑战是什么？",
-                "purpose": "识别潜在的障碍",
-                "expected_insight": "了解需要克服的具体困难"
+            "question": "你目前在这个方向上遇到的主要挑战是什么？",
+            "purpose": "识别潜在的障碍",
+            "expected_insight": "了解需要克服的具体困难"
         },
         {
             "id": "3",
-                "question": "你希望在多长时间内达成这个目标？",
-                "purpose": "设定时间框架",
-                "expected_insight": "了解用户的时间期望"
-            }
-        ]
-    }
-
-async def generate_goal_breakdown(wish: str, outcome: str, answers: dict, phase_count: int = 3) -> dict:
-    """生成目标分解"""
+            "question": "你希望在多长时间内达成这个目标？",
+            "purpose": "设定时间框架",
+            "expected_insight": "了解用户的时间期望"
+        }
+    ]
+}
+
+def get_default_questions():
+    """返回默认的问题列表（共享对象，调用方不得修改）"""
+    return _DEFAULT_QUESTIONS
+
+async def generate_goal_breakdown(wish: str, outcome: str, answers: list[dict], phase_count: int = 3, refresh: bool = False) -> dict:
+    """生成目标分解，refresh=True 时跳过缓存重新生成"""
     try:
         logger.info(f"开始生成目标分解，阶段数量: {phase_count}")
         logger.debug(f"收到的answers: {answers}")  # 添加日志
         
-        # 确保 answers 是列表格式
-        if isinstance(answers, dict):
-            answers_list = [
-                {
-                    "question": qa.get("question", ""),
-                    "answer": qa.get("answer", "")
-                }
-                for qa in answers.values()
-            ]
-        else:
-            answers_list = answers
-        
-        # 构建提示词
+        # 构建提示词（问题答案转换为元组，以便命中提示词缓存）
+        answer_pairs = tuple(
+            (str(qa.get("question", "")), str(qa.get("answer", ""))) for qa in answers
+        )
         try:
-            prompt = PromptManager.get_goal_breakdown_prompt(wish, outcome, answers_list, phase_count)
+            prompt = PromptManager.get_goal_breakdown_prompt(wish, outcome, answer_pairs, phase_count)
             logger.info(f"生成的提示词: {prompt[:200]}...")  # 只记录前200个字符
         except Exception as e:
             logger.error(f"构建提示词失败: {str(e)}")
@@ -257,6 +327,13 @@ async def generate_goal_breakdown(wish: str, outcome: str, answers: dict, phase_
                 detail="生成提示词时出错，请重试"
             )
         
+        cache_key = _prompt_key(prompt)
+        if not refresh:
+            cached = _llm_cache_get(cache_key)
+            if cached is not None:
+                logger.info("命中目标分解缓存")
+                return cached
+        
         # 调用Gemini API
         try:
             response = await get_gemini_response(prompt)
@@ -276,39 +353,32 @@ async def generate_goal_breakdown(wish: str, outcome: str, answers: dict, phase_
         
         try:
             # 清理Markdown格式
-            if "```json" in response_text:
-                response_text = response_text.split("```json")[1].split("```")[0].strip()
-                logger.info("从json代码块中提取内容")
-            elif "```" in response_text:
-                response_text = response_text.split("```")[1].strip()
+            fence = _FENCE_RE.search(response_text)
+            if fence:
+                response_text = fence.group(1).strip()
                 logger.info("从代码块中提取内容")
             
             # 解析JSON
-            data = json.loads(response_text)
+            data = orjson.loads(response_text)
             logger.info("成功解析JSON响应")
             
             # 验证响应格式
-            validate_goal_breakdown(data)
+            schemas.GoalBreakdown.model_validate(data)
             logger.info("数据格式验证通过")
             
             # 确保每个阶段都有正确的ID
             for i, phase in enumerate(data["phases"]):
                 phase["id"] = f"p{i+1}"
             
+            _llm_cache_set(cache_key, data)
             return data
             
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"JSON解析错误: {str(e)}\n响应文本: {response_text}")
             raise HTTPException(
                 status_code=500,
                 detail="生成的内容格式不正确，请重试"
             )
-        except KeyError as e:
-            logger.error(f"缺少必要字段: {str(e)}\n数据: {data}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"生成的内容缺少必要字段: {str(e)}"
-            )
         except ValueError as e:
             logger.error(f"数据验证错误: {str(e)}")
             raise HTTPException(
@@ -325,97 +395,8 @@ async def generate_goal_breakdown(wish: str, outcome: str, answers: dict, phase_
             detail="生成目标分解时出错，请重试。如果问题持续存在，请联系支持。"
         )
 
-def process_implementation_data(data: dict) -> dict:
-    """处理实施方案数据，确保维度和选项的正确关系"""
-    logger.info("开始处理实施方案数据")
-    
-    try:
-        if not isinstance(data, dict):
-            raise ValueError("输入数据必须是字典格式")
-            
-        if "dimensions" not in data:
-            raise ValueError("数据缺少 dimensions 字段")
-            
-        if not isinstance(data["dimensions"], list):
-            raise ValueError("dimensions 必须是列表格式")
-        
-        processed_dimensions = []
-        
-        # 遍历原始维度数据
-        for i, dimension in enumerate(data.get("dimensions", [])):
-            if not isinstance(dimension, dict):
-                raise ValueError(f"维度 {i+1} 必须是字典格式")
-                
-            # 验证必要字段
-            required_fields = ["id", "name", "why", "phase"]
-            missing_fields = [f for f in required_fields if f not in dimension]
-            if missing_fields:
-                raise ValueError(f"维度 {dimension.get('name', f'#{i+1}')} 缺少必要字段: {', '.join(missing_fields)}")
-            
-            # 确保维度有基本结构
-            processed_dimension = {
-                "id": dimension.get("id"),
-                "name": dimension.get("name"),
-                "why": dimension.get("why", ""),
-                "phase": dimension.get("phase", "p1"),
-                "options": []
-            }
-            
-            # 验证和处理选项
-            if "options" not in dimension:
-                raise ValueError(f"维度 {dimension.get('name')} 缺少 options 字段")
-                
-            if not isinstance(dimension["options"], list):
-                raise ValueError(f"维度 {dimension.get('name')} 的 options 必须是列表格式")
-            
-            # 处理选项
-            for j, option in enumerate(dimension["options"]):
-                if not isinstance(option, dict):
-                    raise ValueError(f"维度 {dimension.get('name')} 的选项 {j+1} 必须是字典格式")
-                
-                # 验证选项必要字段
-                required_option_fields = ["id", "name", "difficulty", "time_cost", "actions"]
-                missing_option_fields = [f for f in required_option_fields if f not in option]
-                if missing_option_fields:
-                    raise ValueError(f"选项 {option.get('name', f'#{j+1}')} 缺少必要字段: {', '.join(missing_option_fields)}")
-                
-                # 验证 actions 字段
-                if not isinstance(option.get("actions"), list):
-                    raise ValueError(f"选项 {option.get('name')} 的 actions 必须是列表格式")
-                
-                processed_option = {
-                    "id": option.get("id"),
-                    "name": option.get("name"),
-                    "difficulty": option.get("difficulty", 1),
-                    "time_cost": option.get("time_cost", ""),
-                    "actions": option.get("actions", [])
-                }
-                
-                # 验证 actions 不为空
-                if not processed_option["actions"]:
-                    raise ValueError(f"选项 {option.get('name')} 的 actions 不能为空")
-                
-                processed_dimension["options"].append(processed_option)
-            
-            # 验证选项不为空
-            if not processed_dimension["options"]:
-                raise ValueError(f"维度 {dimension.get('name')} 必须至少包含一个选项")
-            
-            processed_dimensions.append(processed_dimension)
-        
-        # 验证至少有一个维度
-        if not processed_dimensions:
-            raise ValueError("处理后的数据必须至少包含一个维度")
-        
-        logger.info(f"处理完成，共处理 {len(processed_dimensions)} 个维度")
-        return {"dimensions": processed_dimensions}
-        
-    except Exception as e:
-        logger.error(f"处理实施方案数据时出错: {str(e)}")
-        raise ValueError(f"处理数据时出错: {str(e)}")
-
-async def generate_implementation_plan(goal_breakdown: dict) -> dict:
-    """生成实施方案"""
+async def generate_implementation_plan(goal_breakdown: dict, refresh: bool = False) -> dict:
+    """生成实施方案，refresh=True 时跳过缓存重新生成"""
     try:
         logger.info("开始生成实施方案")
         
@@ -430,11 +411,18 @@ async def generate_implementation_plan(goal_breakdown: dict) -> dict:
                 detail="生成提示词时出错，请重试"
             )
         
+        cache_key = _prompt_key(prompt)
+        if not refresh:
+            cached = _llm_cache_get(cache_key)
+            if cached is not None:
+                logger.info("命中实施方案缓存")
+                return cached
+        
         # 调用Gemini API
         try:
             response = await get_gemini_response(prompt)
             logger.info("收到Gemini响应")
-            logger.debug(f"原始响应: {response.text}")
+            logger.debug("原始响应: %s", response.text)
         except Exception as e:
             logger.error(f"调用Gemini API失败: {str(e)}")
             raise HTTPException(
@@ -446,42 +434,13 @@ async def generate_implementation_plan(goal_breakdown: dict) -> dict:
         response_text = response.text.strip()
         
         try:
-            # 提取JSON部分
-            if "```json" in response_text:
-                response_text = response_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in response_text:
-                response_text = response_text.split("```")[1].split("```")[0].strip()
-            
-            # 清理注释和格式化问题
-            lines = []
-            for line in response_text.split('\n'):
-                # 跳过注释行和空行
-                if line.strip().startswith('//') or not line.strip():
-                    continue
-                # 移除行内注释
-                if '//' in line:
-                    line = line.split('//')[0]
-                lines.append(line.strip())
-            
-            # 重新组合文本
-            cleaned_text = '\n'.join(lines)
-            logger.debug(f"清理后的文本: {cleaned_text}")
-            
-            try:
-                data = json.loads(cleaned_text)
-            except json.JSONDecodeError as e:
-                logger.error(f"JSON解析错误: {str(e)}\n清理后的文本: {cleaned_text}")
-                # 尝试修复常见的JSON格式问题
-                cleaned_text = cleaned_text.replace(',]', ']').replace(',}', '}')
-                data = json.loads(cleaned_text)
-            
-            # 处理数据结构
-            processed_data = process_implementation_data(data)
+            processed_data = parse_implementation_plan(response_text)
             logger.info("数据处理完成")
             
+            _llm_cache_set(cache_key, processed_data)
             return processed_data
             
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.error(f"JSON解析错误: {str(e)}\n响应文本: {response_text}")
             raise HTTPException(
                 status_code=500,
@@ -503,69 +462,66 @@ async def generate_implementation_plan(goal_breakdown: dict) -> dict:
             detail="生成实施方案时出错，请重试。如果问题持续存在，请联系支持。"
         )
 
-def validate_goal_breakdown(data: dict) -> None:
-    """验证目标分解的数据格式"""
-    # 验证基本结构
-    if not isinstance(data, dict):
-        raise ValueError("数据必须是字典格式")
-        
-    # 验证goal字段
-    if "goal" not in data:
-        raise KeyError("缺少goal字段")
+def parse_implementation_plan(response_text: str) -> dict:
+    """从Gemini响应文本中解析并校验实施方案"""
+    # 提取JSON部分
+    fence = _FENCE_RE.search(response_text)
+    if fence:
+        response_text = fence.group(1).strip()
     
-    goal = data["goal"]
-    if not isinstance(goal, dict):
-        raise ValueError("goal必须是字典格式")
-        
-    if "description" not in goal:
-        raise KeyError("缺少goal.description字段")
-        
-    if "completion_criteria" not in goal:
-        raise KeyError("缺少goal.completion_criteria字段")
-        
-    criteria = goal["completion_criteria"]
-    if not isinstance(criteria, dict):
-        raise ValueError("completion_criteria必须是字典格式")
-        
-    required_criteria_fields = ["must_have_skills", "must_complete_tasks", "validation_methods"]
-    for field in required_criteria_fields:
-        if field not in criteria:
-            raise KeyError(f"缺少completion_criteria.{field}字段")
-            
-    # 验证phases字段
-    if "phases" not in data:
-        raise KeyError("缺少phases字段")
-        
-    phases = data["phases"]
-    if not isinstance(phases, list):
-        raise ValueError("phases必须是列表格式")
-        
-    for phase in phases:
-        if not isinstance(phase, dict):
-            raise ValueError("phase必须是字典格式")
-            
-        required_phase_fields = ["name", "focus_dimensions", "milestones", "exit_criteria"]
-        for field in required_phase_fields:
-            if field not in phase:
-                raise KeyError(f"阶段缺少{field}字段")
-                
-        if not isinstance(phase["focus_dimensions"], list):
-            raise ValueError("focus_dimensions必须是列表格式")
-            
-        if not isinstance(phase["milestones"], list):
-            raise ValueError("milestones必须是列表格式")
-            
-        if not isinstance(phase["exit_criteria"], dict):
-            raise ValueError("exit_criteria必须是字典格式")
-            
-        exit_criteria = phase["exit_criteria"]
-        if "skills_checklist" not in exit_criteria or "practical_tasks" not in exit_criteria:
-            raise KeyError("exit_criteria缺少必要字段")
+    # 清理注释（直接在UTF-8字节上处理，orjson无需再转换字符串）
+    cleaned = _COMMENT_RE.sub(b'', response_text.encode())
+    logger.debug("清理后的文本: %s", cleaned)
+    
+    try:
+        data = orjson.loads(cleaned)
+    except orjson.JSONDecodeError as e:
+        logger.error(f"JSON解析错误: {str(e)}\n清理后的文本: {cleaned.decode()}")
+        # 尝试修复常见的JSON格式问题（多余的尾逗号）
+        cleaned = _TRAILING_COMMA_RE.sub(rb'\1', cleaned)
+        data = orjson.loads(cleaned)
+    
+    # 验证并规整数据结构
+    return schemas.ImplementationPlan.model_validate(data).model_dump()
+
+def cache_implementation_plan(goal_breakdown: dict, implementation: dict) -> None:
+    """缓存已校验的流式实施方案，之后相同目标分解的 /implementation 请求直接命中缓存"""
+    prompt = PromptManager.get_implementation_plan_prompt(goal_breakdown)
+    _llm_cache_set(_prompt_key(prompt), implementation)
+
+async def stream_implementation_plan(goal_breakdown: dict) -> AsyncIterator[str]:
+    """流式生成实施方案，逐段返回Gemini输出的原始文本"""
+    prompt = PromptManager.get_implementation_plan_prompt(goal_breakdown)
+    response = await _get_model().generate_content_async(prompt, stream=True)
+    async for chunk in response:
+        if chunk.text:
+            yield chunk.text
 
 async def get_gemini_response(prompt: str):
-    """调用Gemini API并获取响应"""
+    """调用Gemini API并获取响应，相同提示词的并发请求合并为一次调用"""
+    key = _prompt_key(prompt)
+    entry = _inflight.get(key)
+    if entry is None:
+        # entry = [任务, 等待者数量]
+        entry = [asyncio.create_task(_call_gemini(prompt)), 0]
+        _inflight[key] = entry
+        entry[0].add_done_callback(lambda _: _inflight.get(key) is entry and _inflight.pop(key))
+    task = entry[0]
+    entry[1] += 1
+    try:
+        # shield: 某个请求被取消时不影响其他等待同一结果的请求
+        return await asyncio.shield(task)
+    finally:
+        entry[1] -= 1
+        # 最后一个等待者也被取消时，不再需要结果，取消底层Gemini调用
+        if entry[1] == 0 and not task.done():
+            if _inflight.get(key) is entry:
+                del _inflight[key]
+            task.cancel()
+
+async def _call_gemini(prompt: str):
     try:
-        response = model.generate_content(prompt)
+        response = await _get_model().generate_content_async(prompt)
         if not response.text:
             raise ValueError("Empty response from Gemini")
         return response
@@ -1,30 +1,39 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, status, BackgroundTasks, Request, Response
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
+import anyio
+import asyncio
+import hashlib
 import json
 import logging
 
 from . import models, schemas
 from .dependencies import (
-    get_db, get_current_user, create_access_token, authenticate_user,
-    generate_questions, generate_goal_breakdown, generate_implementation_plan
+    get_db, get_current_user, create_access_token, authenticate_user, get_password_hash,
+    generate_questions, generate_goal_breakdown, generate_implementation_plan,
+    parse_implementation_plan, stream_implementation_plan, cache_implementation_plan
 )
 from .config import get_settings
+from .database import AsyncSessionLocal, insert_or_ignore
+from .responses import OrjsonResponse
 from .routers import goals
 
 # 配置logger
 logger = logging.getLogger(__name__)
 
 settings = get_settings()
+PREFIX = settings.API_V1_STR
 
 app = FastAPI(
     title="Goal Planner API",
     description="API for goal planning and tracking",
     version="1.0.0",
-    openapi_url=f"{settings.API_V1_STR}/openapi.json",
-    docs_url=f"{settings.API_V1_STR}/docs",
-    redoc_url=f"{settings.API_V1_STR}/redoc",
+    openapi_url=f"{PREFIX}/openapi.json",
+    docs_url=f"{PREFIX}/docs",
+    redoc_url=f"{PREFIX}/redoc",
 )
 
 # 配置CORS
@@ -39,34 +48,31 @@ app.add_middleware(
 )
 
 # 注册路由
-app.include_router(goals.router, prefix=settings.API_V1_STR)
+app.include_router(goals.router, prefix=PREFIX)
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to Goal Planner API"}
 
-@app.post(f"{settings.API_V1_STR}/register", response_model=schemas.User)
+@app.post(f"{PREFIX}/register", response_model=schemas.User)
 async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
-    db_user = await db.execute(
-        models.User.__table__.select().where(models.User.email == user.email)
+    # 密码哈希是CPU密集操作，放到线程池执行，避免阻塞事件循环
+    hashed_password = await anyio.to_thread.run_sync(get_password_hash, user.password)
+    
+    # 由email唯一约束判断是否已注册，检查和插入在同一条语句中完成，并发注册也不会冲突
+    db_user = await insert_or_ignore(
+        db, models.User, ["email"],
+        email=user.email, hashed_password=hashed_password
     )
-    if db_user.scalar_one_or_none():
+    if db_user is None:
         raise HTTPException(
             status_code=400,
             detail="Email already registered"
         )
-    
-    from .dependencies import get_password_hash
-    db_user = models.User(
-        email=user.email,
-        hashed_password=get_password_hash(user.password)
-    )
-    db.add(db_user)
     await db.commit()
-    await db.refresh(db_user)
     return db_user
 
-@app.post(f"{settings.API_V1_STR}/login")
+@app.post(f"{PREFIX}/login")
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: AsyncSession = Depends(get_db)
@@ -83,115 +89,114 @@ async def login(
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
-@app.post(f"{settings.API_V1_STR}/goals", response_model=schemas.Goal)
+@app.post(f"{PREFIX}/goals", response_model=schemas.Goal)
 async def create_goal(
     goal: schemas.GoalCreate,
     db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    db_goal = models.Goal(**goal.dict(), user_id=current_user.id)
+    db_goal = models.Goal(**goal.model_dump(), user_id=current_user.id)
     db.add(db_goal)
     await db.commit()
     await db.refresh(db_goal)
     return db_goal
 
-@app.post(f"{settings.API_V1_STR}/goals/{{goal_id}}/questions")
+# 以下接口直接返回LLM生成的大型嵌套字典（没有response_model），使用orjson序列化；
+# 声明了response_model的接口由FastAPI通过pydantic直接序列化，无需指定
+@app.post(f"{PREFIX}/goals/{{goal_id}}/questions", response_class=OrjsonResponse)
 async def generate_goal_questions(
     goal_id: int,
-    db: AsyncSession = Depends(get_db),
+    refresh: bool = False,
     current_user: models.User = Depends(get_current_user)
 ):
-    result = await db.execute(
-        models.Goal.__table__.select().where(
-            models.Goal.id == goal_id,
-            models.Goal.user_id == current_user.id
+    # 会话只在读取时打开，调用Gemini期间不占用数据库连接
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(models.Goal.wish, models.Goal.outcome).where(
+                models.Goal.id == goal_id,
+                models.Goal.user_id == current_user.id
+            )
         )
-    )
-    goal_data = result.first()
+        goal_data = result.mappings().first()
     if not goal_data:
         raise HTTPException(status_code=404, detail="Goal not found")
     
-    # 从元组中获取wish和outcome
-    wish = goal_data[2]  # 第三个元素是wish
-    outcome = goal_data[3]  # 第四个元素是outcome
-    
-    questions = await generate_questions(wish, outcome)
+    wish, outcome = goal_data["wish"], goal_data["outcome"]
+    questions = await generate_questions(wish, outcome, refresh=refresh)
     return questions  # 直接返回字典，不需要json.loads
 
-@app.post(f"{settings.API_V1_STR}/goals/{{goal_id}}/breakdown")
+@app.post(f"{PREFIX}/goals/{{goal_id}}/breakdown", response_class=OrjsonResponse)
 async def create_goal_breakdown(
     goal_id: int,
     answers: list[dict],
-    db: AsyncSession = Depends(get_db),
+    refresh: bool = False,
     current_user: models.User = Depends(get_current_user)
 ):
     try:
-        # 获取目标信息
-        result = await db.execute(
-            models.Goal.__table__.select().where(
-                models.Goal.id == goal_id,
-                models.Goal.user_id == current_user.id
+        # 获取目标信息（只取生成需要的列，会话在调用Gemini前关闭以释放连接）
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(models.Goal.wish, models.Goal.outcome).where(
+                    models.Goal.id == goal_id,
+                    models.Goal.user_id == current_user.id
+                )
             )
-        )
-        goal_data = result.first()
+            goal_data = result.mappings().first()
         if not goal_data:
             raise HTTPException(status_code=404, detail="Goal not found")
         
-        wish = goal_data[2]  # 第三个元素是wish
-        outcome = goal_data[3]  # 第四个元素是outcome
-        
-        # 转换答案格式
-        answers_dict = {
-            str(i+1): {
-                "question": answer.get("question", ""),
-                "answer": answer.get("answer", "")
-            }
-            for i, answer in enumerate(answers)
-        }
+        wish, outcome = goal_data["wish"], goal_data["outcome"]
         
         # 生成目标分解（现在直接返回字典）
-        goal_breakdown = await generate_goal_breakdown(wish, outcome, answers_dict)
+        goal_breakdown = await generate_goal_breakdown(wish, outcome, answers, refresh=refresh)
         
-        # 更新数据库
-        await db.execute(
-            models.Goal.__table__.update().where(
-                models.Goal.id == goal_id
-            ).values(
-                questions_answers=answers,
-                goal_breakdown=goal_breakdown
+        # 更新数据库（归属校验与更新合并为一条 UPDATE ... RETURNING）
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(models.Goal).where(
+                    models.Goal.id == goal_id,
+                    models.Goal.user_id == current_user.id
+                ).values(
+                    questions_answers=answers,
+                    goal_breakdown=goal_breakdown
+                ).returning(models.Goal.id)
             )
-        )
-        await db.commit()
+            if result.first() is None:
+                raise HTTPException(status_code=404, detail="Goal not found")
+            await db.commit()
         
         return goal_breakdown
-        
+
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error in create_goal_breakdown: {str(e)}")
+        logger.exception("Error in create_goal_breakdown")
         raise HTTPException(
             status_code=500,
             detail=str(e)
         )
 
-@app.post(f"{settings.API_V1_STR}/goals/{{goal_id}}/implementation")
+@app.post(f"{PREFIX}/goals/{{goal_id}}/implementation", response_class=OrjsonResponse)
 async def create_implementation_plan(
     goal_id: int,
-    db: AsyncSession = Depends(get_db),
+    refresh: bool = False,
     current_user: models.User = Depends(get_current_user)
 ):
     try:
-        # 获取目标
-        result = await db.execute(
-            models.Goal.__table__.select().where(
-                models.Goal.id == goal_id,
-                models.Goal.user_id == current_user.id
+        # 获取目标（只取目标分解，会话在调用Gemini前关闭以释放连接）
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(models.Goal.id, models.Goal.goal_breakdown).where(
+                    models.Goal.id == goal_id,
+                    models.Goal.user_id == current_user.id
+                )
             )
-        )
-        goal_data = result.first()
+            goal_data = result.mappings().first()
         if not goal_data:
             raise HTTPException(status_code=404, detail="目标不存在")
         
         # 检查是否有目标分解
-        goal_breakdown = goal_data[7]  # goal_breakdown 在第8列
+        goal_breakdown = goal_data["goal_breakdown"]
         if not goal_breakdown:
             raise HTTPException(
                 status_code=400,
@@ -200,22 +205,25 @@ async def create_implementation_plan(
         
         try:
             # 生成实施方案
-            implementation = await generate_implementation_plan(goal_breakdown)
+            implementation = await generate_implementation_plan(goal_breakdown, refresh=refresh)
             
-            # 更新数据库
-            await db.execute(
-                models.Goal.__table__.update().where(
-                    models.Goal.id == goal_id
-                ).values(
-                    implementation_plan=implementation
+            # 更新数据库（归属校验与更新合并为一条 UPDATE ... RETURNING）
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    update(models.Goal).where(
+                        models.Goal.id == goal_id,
+                        models.Goal.user_id == current_user.id
+                    ).values(
+                        implementation_plan=implementation
+                    ).returning(models.Goal.id)
                 )
-            )
-            await db.commit()
+                if result.first() is None:
+                    raise HTTPException(status_code=404, detail="目标不存在")
+                await db.commit()
             
             return implementation
             
         except Exception as e:
-            await db.rollback()
             logger.error(f"生成实施方案失败: {str(e)}")
             if isinstance(e, HTTPException):
                 raise e
@@ -233,71 +241,237 @@ async def create_implementation_plan(
             detail=f"处理请求时出错：{str(e)}"
         )
 
-@app.get(f"{settings.API_V1_STR}/goals", response_model=list[schemas.Goal])
+@app.post(f"{PREFIX}/goals/{{goal_id}}/full_plan", response_class=OrjsonResponse)
+async def create_full_plan(
+    goal_id: int,
+    answers: list[dict],
+    refresh: bool = False,
+    current_user: models.User = Depends(get_current_user)
+):
+    """一次请求完成目标分解和实施方案生成，refresh=True 时两步都跳过缓存"""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(models.Goal.wish, models.Goal.outcome).where(
+                models.Goal.id == goal_id,
+                models.Goal.user_id == current_user.id
+            )
+        )
+        goal_data = result.mappings().first()
+    if not goal_data:
+        raise HTTPException(status_code=404, detail="Goal not found")
+    
+    wish, outcome = goal_data["wish"], goal_data["outcome"]
+    
+    try:
+        goal_breakdown = await generate_goal_breakdown(wish, outcome, answers, refresh=refresh)
+        
+        async def save_breakdown():
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    update(models.Goal).where(
+                        models.Goal.id == goal_id,
+                        models.Goal.user_id == current_user.id
+                    ).values(
+                        questions_answers=answers,
+                        goal_breakdown=goal_breakdown
+                    ).returning(models.Goal.id)
+                )
+                if result.first() is None:
+                    raise HTTPException(status_code=404, detail="Goal not found")
+                await db.commit()
+        
+        # 保存目标分解与生成实施方案互不依赖，并发执行以缩短总耗时；
+        # 任一步失败（或请求被取消）时取消实施方案任务，没有其他请求等待同一提示词时，
+        # 底层Gemini调用也会随之取消（见 get_gemini_response）
+        plan_task = asyncio.create_task(
+            generate_implementation_plan(goal_breakdown, refresh=refresh)
+        )
+        try:
+            await save_breakdown()
+            implementation = await plan_task
+        except BaseException:
+            plan_task.cancel()
+            raise
+        
+        # 更新数据库（生成期间目标可能已被删除，归属校验与更新合并为一条 UPDATE ... RETURNING）
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(models.Goal).where(
+                    models.Goal.id == goal_id,
+                    models.Goal.user_id == current_user.id
+                ).values(
+                    implementation_plan=implementation
+                ).returning(models.Goal.id)
+            )
+            if result.first() is None:
+                raise HTTPException(status_code=404, detail="Goal not found")
+            await db.commit()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"生成完整方案失败: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"生成完整方案时出错：{str(e)}"
+        )
+    
+    return {
+        "goal_breakdown": goal_breakdown,
+        "implementation_plan": implementation
+    }
+
+async def save_streamed_implementation_plan(
+    goal_id: int, user_id: int, goal_breakdown: dict, chunks: list[str]
+):
+    """流式输出结束后，校验拼接好的实施方案，写入缓存和数据库"""
+    # 生成失败时 chunks 已被清空，错误已在流中记录，无需再解析
+    if not chunks:
+        return
+    
+    try:
+        implementation = parse_implementation_plan("".join(chunks))
+    except ValueError as e:
+        logger.error(f"流式实施方案解析失败，目标ID: {goal_id}, 错误: {str(e)}")
+        return
+    
+    cache_implementation_plan(goal_breakdown, implementation)
+    
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(models.Goal).where(
+                models.Goal.id == goal_id,
+                models.Goal.user_id == user_id
+            ).values(
+                implementation_plan=implementation
+            )
+        )
+        await db.commit()
+    logger.info(f"流式实施方案已保存，目标ID: {goal_id}")
+
+@app.post(f"{PREFIX}/goals/{{goal_id}}/implementation/stream")
+async def stream_goal_implementation_plan(
+    goal_id: int,
+    background_tasks: BackgroundTasks,
+    current_user: models.User = Depends(get_current_user)
+):
+    """以SSE流式返回实施方案的原始文本，客户端在流结束后解析；服务端在后台校验并保存"""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(models.Goal.id, models.Goal.goal_breakdown).where(
+                models.Goal.id == goal_id,
+                models.Goal.user_id == current_user.id
+            )
+        )
+        goal_data = result.mappings().first()
+    if not goal_data:
+        raise HTTPException(status_code=404, detail="目标不存在")
+    
+    goal_breakdown = goal_data["goal_breakdown"]
+    if not goal_breakdown:
+        raise HTTPException(
+            status_code=400,
+            detail="必须先完成目标分解"
+        )
+    
+    chunks: list[str] = []
+    
+    async def event_stream():
+        try:
+            async for text in stream_implementation_plan(goal_breakdown):
+                chunks.append(text)
+                yield f"data: {json.dumps(text, ensure_ascii=False)}\n\n"
+        except Exception as e:
+            logger.error(f"流式生成实施方案失败: {str(e)}")
+            chunks.clear()
+            yield f"event: error\ndata: {json.dumps('AI服务暂时不可用，请稍后重试', ensure_ascii=False)}\n\n"
+            return
+        yield "event: done\ndata: {}\n\n"
+    
+    # 响应流结束后才会执行后台任务，此时 chunks 已包含完整输出
+    background_tasks.add_task(save_streamed_implementation_plan, goal_id, current_user.id, goal_breakdown, chunks)
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+def goals_etag(versions) -> str:
+    """根据 (id, updated_at) 计算ETag，目标有任何修改、新增或删除时都会变化"""
+    digest = hashlib.blake2b(digest_size=8)
+    for goal_id, updated_at in versions:
+        digest.update(f"{goal_id}:{updated_at.timestamp()};".encode())
+    return f'"{digest.hexdigest()}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return etag in (tag.strip() for tag in if_none_match.split(","))
+
+@app.get(f"{PREFIX}/goals", response_model=list[schemas.GoalSummary])
 async def get_goals(
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
+    # 列表只返回摘要，分解和方案是否存在由数据库判断，不读取JSON大字段；
+    # 完整内容通过 GET /goals/{id} 获取
     result = await db.execute(
-        models.Goal.__table__.select().where(models.Goal.user_id == current_user.id)
+        select(
+            models.Goal.id,
+            models.Goal.wish,
+            models.Goal.outcome,
+            models.Goal.created_at,
+            models.Goal.updated_at,
+            models.Goal.goal_breakdown.is_not(None).label("has_breakdown"),
+            models.Goal.implementation_plan.is_not(None).label("has_plan"),
+        )
+        .where(models.Goal.user_id == current_user.id)
+        .order_by(models.Goal.id)
     )
     goals = result.all()
-    return [
-        {
-            "id": goal[0],
-            "user_id": goal[1],
-            "wish": goal[2],
-            "outcome": goal[3],
-            "created_at": goal[4],
-            "updated_at": goal[5],
-            "questions_answers": goal[6],
-            "goal_breakdown": goal[7],
-            "implementation_plan": goal[8]
-        }
-        for goal in goals
-    ]
+    etag = goals_etag((goal.id, goal.updated_at) for goal in goals)
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    response.headers["ETag"] = etag
+    return goals
 
-@app.get(f"{settings.API_V1_STR}/goals/{{goal_id}}", response_model=schemas.Goal)
+@app.get(f"{PREFIX}/goals/{{goal_id}}", response_model=schemas.Goal)
 async def get_goal(
     goal_id: int,
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    result = await db.execute(
-        models.Goal.__table__.select().where(
+    goal = await db.scalar(
+        select(models.Goal).where(
             models.Goal.id == goal_id,
             models.Goal.user_id == current_user.id
         )
     )
-    goal = result.first()
     if not goal:
         raise HTTPException(status_code=404, detail="Goal not found")
     
-    return {
-        "id": goal[0],
-        "user_id": goal[1],
-        "wish": goal[2],
-        "outcome": goal[3],
-        "created_at": goal[4],
-        "updated_at": goal[5],
-        "questions_answers": goal[6],
-        "goal_breakdown": goal[7],
-        "implementation_plan": goal[8]
-    }
+    # 一次查询取出整行，客户端缓存仍有效时返回304，省去响应序列化和传输
+    etag = goals_etag([(goal.id, goal.updated_at)])
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    response.headers["ETag"] = etag
+    return goal
 
-@app.delete(f"{settings.API_V1_STR}/goals/{{goal_id}}")
+@app.delete(f"{PREFIX}/goals/{{goal_id}}")
 async def delete_goal(
     goal_id: int,
     db: AsyncSession = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
     result = await db.execute(
-        models.Goal.__table__.select().where(
+        select(models.Goal.id).where(
             models.Goal.id == goal_id,
             models.Goal.user_id == current_user.id
         )
     )
-    goal = result.scalar_one_or_none()
+    goal = result.mappings().first()
     if not goal:
         raise HTTPException(status_code=404, detail="Goal not found")
     
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, JSON
+from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
@@ -15,6 +15,8 @@ class User(Base):
 
 class Goal(Base):
     __tablename__ = "goals"
+    # 所有目标接口都按 (user_id, id) 过滤，列表接口按 user_id 前缀扫描
+    __table_args__ = (Index("ix_goals_user_id_id", "user_id", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -1,7 +1,9 @@
-import json
+from functools import lru_cache
+import orjson
 
 class PromptManager:
     @staticmethod
+    @lru_cache(maxsize=1024)
     def get_question_generation_prompt(wish: str, outcome: str) -> str:
         return f"""你是一个目标分析专家。在你面前的用户对实现目标没有清晰认知。你的任务是基于用户的目标(W)和期望结果(O)，生成3个最关键的问题，这些问题的答案将帮助我们更好地理解用户情况并制定计划。
 
@@ -32,6 +34,7 @@ class PromptManager:
 }}"""
 
     @staticmethod
+    @lru_cache(maxsize=1024)
     def get_questions_prompt(wish: str, outcome: str) -> str:
         return f"""作为一个目标分解专家，我需要你帮助用户更好地理解和分解他们的目标。
 用户的愿望是：{wish}
@@ -56,14 +59,13 @@ class PromptManager:
 }}"""
 
     @staticmethod
-    def get_goal_breakdown_prompt(wish: str, outcome: str, answers: list, phase_count: int = 3) -> str:
-        """生成目标分解的提示词"""
+    @lru_cache(maxsize=1024)
+    def get_goal_breakdown_prompt(wish: str, outcome: str, answers: tuple, phase_count: int = 3) -> str:
+        """生成目标分解的提示词，answers 为 (问题, 回答) 元组序列以便缓存"""
         # 构建问题答案的字符串
-        answers_text = "\n".join([
-            f"问题：{answer['question'] if isinstance(answer, dict) else str(answer)}\n" +
-            f"回答：{answer['answer'] if isinstance(answer, dict) and 'answer' in answer else ''}"
-            for answer in answers
-        ])
+        answers_text = "\n".join(
+            f"问题：{question}\n回答：{answer}" for question, answer in answers
+        )
         
         return f"""你是一个目标分解与规划专家。基于用户的目标(W)、期望结果(O)和问题回答，你的任务是制定清晰的目标达成路径。
 
@@ -137,13 +139,14 @@ class PromptManager:
   ]
 }}"""
 
-    @staticmethod
-    def get_implementation_plan_prompt(goal_breakdown: dict) -> str:
-        return f"""你是一个解决方案设计专家。基于已确认的目标分解和阶段规划，你的任务是设计具体的实施方案。
+    # 实施方案提示词除目标分解外都是固定文本，拆成首尾常量，运行时只做一次拼接
+    _IMPL_HEAD = """你是一个解决方案设计专家。基于已确认的目标分解和阶段规划，你的任务是设计具体的实施方案。
 
 输入：
 - 已确认的目标分解和阶段规划：
-{json.dumps(goal_breakdown, ensure_ascii=False, indent=2)}
+"""
+
+    _IMPL_TAIL = """
 
 要求：
 1. 每个维度至少5-20个选项
@@ -155,15 +158,15 @@ class PromptManager:
 7. 确保输出的是完整且有效的JSON格式
 
 输出格式：
-{{
+{
   "dimensions": [
-    {{
+    {
       "id": "d1",
       "name": "维度名称",
       "why": "为什么这个维度重要",
       "phase": "属于哪个阶段",
       "options": [
-        {{
+        {
           "id": "d1_o1",
           "name": "选项名称",
           "difficulty": "1-5",
@@ -172,11 +175,11 @@ class PromptManager:
             "具体可执行的行动1",
             "具体可执行的行动2"
           ]
-        }}
+        }
       ]
-    }}
+    }
   ]
-}}
+}
 
 验证要求：
 1. 所有选项和行动必须与目标阶段匹配
@@ -185,3 +188,9 @@ class PromptManager:
 4. 时间预估要实际可行
 5. 确保每个维度都有完整的选项列表，不要使用省略或注释
 6. 输出必须是完整且有效的JSON格式"""
+
+    @staticmethod
+    def get_implementation_plan_prompt(goal_breakdown: dict) -> str:
+        """生成实施方案的提示词，目标分解以缩进格式嵌入，中文保持原样"""
+        goal_breakdown_json = orjson.dumps(goal_breakdown, option=orjson.OPT_INDENT_2).decode()
+        return PromptManager._IMPL_HEAD + goal_breakdown_json + PromptManager._IMPL_TAIL
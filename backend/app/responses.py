@@ -0,0 +1,7 @@
+from fastapi.responses import JSONResponse
+import orjson
+
+class OrjsonResponse(JSONResponse):
+    """使用orjson序列化的JSON响应（FastAPI 0.131起自带的ORJSONResponse已弃用）"""
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
@@ -1,11 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
 from typing import List, Optional
 import logging
 from pydantic import BaseModel
 
-from ..dependencies import get_db, get_current_user, generate_goal_breakdown
+from ..database import AsyncSessionLocal
+from ..dependencies import get_current_user, generate_goal_breakdown
 from ..models import Goal, User
+from ..responses import OrjsonResponse
 from ..schemas import GoalCreate, GoalBreakdown
 
 # 配置logger
@@ -16,32 +18,29 @@ router = APIRouter(prefix="/goals", tags=["goals"])
 class RegenerateRequest(BaseModel):
     phase_count: int
 
-@router.post("/{goal_id}/regenerate")
+@router.post("/{goal_id}/regenerate", response_class=OrjsonResponse)
 async def regenerate_goal_breakdown(
     goal_id: int,
     request: RegenerateRequest,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: User = Depends(get_current_user)
 ):
     """重新生成目标分解，可以指定阶段数量"""
     try:
-        # 获取目标
-        result = await db.execute(
-            Goal.__table__.select().where(
-                Goal.id == goal_id,
-                Goal.user_id == current_user.id
+        # 获取目标（查询条件已包含 user_id，不属于当前用户的目标视为不存在）
+        # 会话在调用Gemini前关闭，生成期间不占用数据库连接
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Goal.wish, Goal.outcome, Goal.questions_answers).where(
+                    Goal.id == goal_id,
+                    Goal.user_id == current_user.id
+                )
             )
-        )
-        goal = result.first()
+            goal = result.mappings().first()
         if not goal:
             raise HTTPException(status_code=404, detail="目标不存在")
         
-        # 验证权限
-        if goal[1] != current_user.id:  # goal[1] 是 user_id
-            raise HTTPException(status_code=403, detail="没有权限访问此目标")
-        
         # 确保有问题答案
-        questions_answers = goal[6]  # goal[6] 是 questions_answers
+        questions_answers = goal["questions_answers"]
         if not questions_answers:
             raise HTTPException(status_code=400, detail="请先完成问题回答")
         
@@ -51,26 +50,34 @@ async def regenerate_goal_breakdown(
         # 重新生成目标分解
         try:
             breakdown = await generate_goal_breakdown(
-                goal[2],  # wish
-                goal[3],  # outcome
+                goal["wish"],
+                goal["outcome"],
                 questions_answers,
-                request.phase_count
+                request.phase_count,
+                refresh=True
             )
             
-            # 更新数据库
-            await db.execute(
-                Goal.__table__.update()
-                .where(Goal.id == goal_id)
-                .values(goal_breakdown=breakdown)
-            )
-            await db.commit()
+            # 更新数据库（生成期间目标可能已被删除，归属校验与更新合并为一条 UPDATE ... RETURNING）
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    update(Goal).where(
+                        Goal.id == goal_id,
+                        Goal.user_id == current_user.id
+                    ).values(
+                        goal_breakdown=breakdown
+                    ).returning(Goal.id)
+                )
+                if result.first() is None:
+                    raise HTTPException(status_code=404, detail="目标不存在")
+                await db.commit()
             
             logger.info(f"成功生成目标分解，目标ID: {goal_id}")
             return breakdown
             
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"生成目标分解失败: {str(e)}")
-            await db.rollback()
             raise HTTPException(
                 status_code=500,
                 detail=f"生成目标分解时出错：{str(e)}"
@@ -80,7 +87,6 @@ async def regenerate_goal_breakdown(
         raise
     except Exception as e:
         logger.error(f"处理请求时出错: {str(e)}")
-        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail="处理请求时出错，请重试"
@@ -2,7 +2,9 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 from pydantic import BaseModel
+import anyio
 
+from ..database import insert_or_ignore
 from ..dependencies import get_db, get_current_user, get_password_hash
 from ..models import User
 from ..schemas import UserCreate, User as UserSchema
@@ -12,24 +14,20 @@ router = APIRouter(prefix="/users", tags=["users"])
 @router.post("", response_model=UserSchema)
 async def create_user(user: UserCreate, db: Session = Depends(get_db)):
     """创建新用户"""
-    # 检查邮箱是否已存在
-    db_user = await db.execute(
-        User.__table__.select().where(User.email == user.email)
+    # 密码哈希放到线程池执行，避免阻塞事件循环
+    hashed_password = await anyio.to_thread.run_sync(get_password_hash, user.password)
+    
+    # 创建新用户，邮箱已存在时由唯一约束跳过插入
+    db_user = await insert_or_ignore(
+        db, User, ["email"],
+        email=user.email, hashed_password=hashed_password
     )
-    if db_user.scalar_one_or_none():
+    if db_user is None:
         raise HTTPException(
             status_code=400,
             detail="邮箱已被注册"
         )
-    
-    # 创建新用户
-    db_user = User(
-        email=user.email,
-        hashed_password=get_password_hash(user.password)
-    )
-    db.add(db_user)
     await db.commit()
-    await db.refresh(db_user)
     return db_user
 
 @router.get("/me", response_model=UserSchema)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, Dict, Any, List
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
+from typing import Optional, Dict, Any, List, Union
 from datetime import datetime
 
 class UserBase(BaseModel):
@@ -10,9 +10,8 @@ class UserCreate(UserBase):
 
 class User(UserBase):
     id: int
-    
-    class Config:
-        from_attributes = True
+
+    model_config = ConfigDict(from_attributes=True)
 
 class GoalBase(BaseModel):
     wish: str
@@ -35,8 +34,17 @@ class Goal(GoalBase):
     goal_breakdown: Optional[Dict[str, Any]] = None
     implementation_plan: Optional[Dict[str, Any]] = None
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+class GoalSummary(GoalBase):
+    """目标列表使用的精简结构，不包含分解和方案的JSON内容"""
+    id: int
+    created_at: datetime
+    updated_at: datetime
+    has_breakdown: bool
+    has_plan: bool
+
+    model_config = ConfigDict(from_attributes=True)
 
 class Token(BaseModel):
     access_token: str
@@ -50,9 +58,52 @@ class QuestionGeneration(BaseModel):
     analysis: Dict[str, Any]
     questions: List[Dict[str, Any]]
 
+class CompletionCriteria(BaseModel):
+    must_have_skills: List[Any]
+    must_complete_tasks: List[Any]
+    validation_methods: List[Any]
+
+    model_config = ConfigDict(extra="allow")
+
+class GoalDefinition(BaseModel):
+    description: str
+    completion_criteria: CompletionCriteria
+
+    model_config = ConfigDict(extra="allow")
+
+class ExitCriteria(BaseModel):
+    skills_checklist: List[Any]
+    practical_tasks: List[Any]
+
+    model_config = ConfigDict(extra="allow")
+
+class Phase(BaseModel):
+    name: str
+    focus_dimensions: List[Any]
+    milestones: List[Any]
+    exit_criteria: ExitCriteria
+
+    model_config = ConfigDict(extra="allow")
+
 class GoalBreakdown(BaseModel):
-    goal: Dict[str, Any]
-    phases: List[Dict[str, Any]]
+    goal: GoalDefinition
+    phases: List[Phase]
+
+    model_config = ConfigDict(extra="allow")
+
+class ImplementationOption(BaseModel):
+    id: str
+    name: str
+    difficulty: Union[int, str]
+    time_cost: str
+    actions: List[Any] = Field(min_length=1)
+
+class Dimension(BaseModel):
+    id: str
+    name: str
+    why: str
+    phase: str
+    options: List[ImplementationOption] = Field(min_length=1)
 
 class ImplementationPlan(BaseModel):
-    dimensions: List[Dict[str, Any]]
+    dimensions: List[Dimension] = Field(min_length=1)